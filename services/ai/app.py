@@ -1,16 +1,82 @@
+import hashlib
 import os
+from collections import OrderedDict
 from fastapi import FastAPI
-from pydantic import BaseModel
+from openai import AsyncOpenAI
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 
 app = FastAPI(title="redcliff-ai", version="0.1.0")
 
+# Read once at import; changing these env vars requires a process restart.
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
 
+# One client for the process so requests share the HTTP connection pool.
+_CLIENT = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None) if OPENAI_API_KEY else None
+
+# Officer-centric style guide (user explicitly does NOT want ruler/lord fantasy).
+# Key constraint: never phrase social actions as "a lord bestows -> loyalty pledge".
+DEFAULT_FORBID = [
+    "하사", "내리니", "내리다", "충성을 맹세", "충성 맹세", "주군", "신하", "군주께서", "명하여",
+    "책봉", "봉작", "하달", "조칙", "어명", "황제"
+]
+
+
+def _build_system_prompt(forbid_line: str, is_pledge: bool) -> str:
+    # System prompt keeps it short, modern, and strictly from an officer POV.
+    prompt = (
+        "너는 삼국지 세계의 '기록관'이지만, 이 게임은 군주가 아니라 '장수 1인 시점' RPG다.\n"
+        "규칙/판정은 이미 서버에서 확정됐다. 너는 결과를 '표현'만 한다.\n"
+        "반드시 지켜라:\n"
+        f"- 금지어/금지표현: {forbid_line}\n"
+        "- 선물/연회/교류는 '동료 장수 간 호의/신뢰/친분'으로만 묘사한다. (권력관계 암시 금지)\n"
+        "- 1~2문장, 과장/미사여구 과다 금지. 직관적이고 쉬운 문장.\n"
+        "- 결과 숫자/요약은 바꾸지 말고, 의미만 덧붙여라.\n"
+        "- '충성'이라는 단어는 pledge(임관) 같은 행동일 때만 제한적으로 허용한다.\n"
+    )
+    if is_pledge:
+        prompt += "- pledge는 '임관/합류'로 표현하되, 과도한 군주 미화는 금지.\n"
+    return prompt
+
+
+# Prebuilt prompts for the common case (no per-request forbid override).
+_DEFAULT_FORBID_LINE = ", ".join(DEFAULT_FORBID)
+_DEFAULT_SYSTEM_PROMPT = _build_system_prompt(_DEFAULT_FORBID_LINE, is_pledge=False)
+_DEFAULT_SYSTEM_PROMPT_PLEDGE = _build_system_prompt(_DEFAULT_FORBID_LINE, is_pledge=True)
+
+# Game events repeat identical prompts a lot; each cache hit saves a full
+# OpenAI round-trip. Bounded LRU keyed by a digest of the composed prompts.
+_CACHE_MAX = 4096
+_narration_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+async def _call_openai(system_prompt: str, user_prompt: str) -> Optional[str]:
+    key = hashlib.sha256(f"{system_prompt}\x00{user_prompt}".encode()).hexdigest()
+    cached = _narration_cache.get(key)
+    if cached is not None:
+        _narration_cache.move_to_end(key)
+        return cached
+    completion = await _CLIENT.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        temperature=0.7,
+    )
+    text = completion.choices[0].message.content
+    if text:
+        _narration_cache[key] = text
+        if len(_narration_cache) > _CACHE_MAX:
+            _narration_cache.popitem(last=False)
+    return text
+
 
 class NarrativeInput(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     actor: str
     action: str
     result: str
@@ -25,9 +91,6 @@ class NarrativeInput(BaseModel):
     location: Optional[str] = None
     lore: Optional[List[dict]] = None  # [{title, body, source}]
 
-    class Config:
-        extra = "ignore"
-
 
 @app.get('/health')
 def health():
@@ -35,7 +98,7 @@ def health():
 
 
 @app.post('/narrate')
-def narrate(payload: NarrativeInput):
+async def narrate(payload: NarrativeInput):
     if not OPENAI_API_KEY:
         text = (
             f"{payload.actor}의 행동({payload.action}) 결과: {payload.result}. "
@@ -43,49 +106,27 @@ def narrate(payload: NarrativeInput):
         )
         return {"text": text, "provider": "template"}
 
-    from openai import OpenAI
-
-    kwargs = {"api_key": OPENAI_API_KEY}
-    if OPENAI_BASE_URL:
-        kwargs["base_url"] = OPENAI_BASE_URL
-    client = OpenAI(**kwargs)
-
-    # Officer-centric style guide (user explicitly does NOT want ruler/lord fantasy).
-    # Key constraint: never phrase social actions as "a lord bestows -> loyalty pledge".
-    forbid = payload.forbid_phrases or [
-        "하사", "내리니", "내리다", "충성을 맹세", "충성 맹세", "주군", "신하", "군주께서", "명하여",
-        "책봉", "봉작", "하달", "조칙", "어명", "황제"
-    ]
-    forbid_line = ", ".join(forbid)
-
     action = (payload.action or "").strip()
     is_pledge = action.startswith("pledge")
 
-    # System prompt keeps it short, modern, and strictly from an officer POV.
-    system_prompt = (
-        "너는 삼국지 세계의 '기록관'이지만, 이 게임은 군주가 아니라 '장수 1인 시점' RPG다.\n"
-        "규칙/판정은 이미 서버에서 확정됐다. 너는 결과를 '표현'만 한다.\n"
-        "반드시 지켜라:\n"
-        f"- 금지어/금지표현: {forbid_line}\n"
-        "- 선물/연회/교류는 '동료 장수 간 호의/신뢰/친분'으로만 묘사한다. (권력관계 암시 금지)\n"
-        "- 1~2문장, 과장/미사여구 과다 금지. 직관적이고 쉬운 문장.\n"
-        "- 결과 숫자/요약은 바꾸지 말고, 의미만 덧붙여라.\n"
-        "- '충성'이라는 단어는 pledge(임관) 같은 행동일 때만 제한적으로 허용한다.\n"
-    )
-    if is_pledge:
-        system_prompt += "- pledge는 '임관/합류'로 표현하되, 과도한 군주 미화는 금지.\n"
-
-    user_prompt = (
-        f"행동자: {payload.actor} (role={payload.actor_role})\n"
-        f"대상: {payload.target or '-'}\n"
-        f"위치: {payload.location or '-'}\n"
-        f"시간: {payload.time or '-'}\n"
-        f"현재 목표: {payload.objective or '-'}\n"
-        f"행동: {payload.action}\n"
-        f"결과: {payload.result}\n"
-        f"분위기: {payload.mood}\n"
-        "위 정보를 바탕으로 1~2문장 내러티브를 작성하라."
-    )
+    if payload.forbid_phrases:
+        system_prompt = _build_system_prompt(", ".join(payload.forbid_phrases), is_pledge)
+    elif is_pledge:
+        system_prompt = _DEFAULT_SYSTEM_PROMPT_PLEDGE
+    else:
+        system_prompt = _DEFAULT_SYSTEM_PROMPT
+
+    prompt_parts = [
+        f"행동자: {payload.actor} (role={payload.actor_role})",
+        f"대상: {payload.target or '-'}",
+        f"위치: {payload.location or '-'}",
+        f"시간: {payload.time or '-'}",
+        f"현재 목표: {payload.objective or '-'}",
+        f"행동: {payload.action}",
+        f"결과: {payload.result}",
+        f"분위기: {payload.mood}",
+        "위 정보를 바탕으로 1~2문장 내러티브를 작성하라.",
+    ]
 
     lore_lines = []
     try:
@@ -96,21 +137,17 @@ def narrate(payload: NarrativeInput):
                 if not (title or body):
                     continue
                 line = f"- {title}: {body}" if title else f"- {body}"
-                lore_lines.append(line[:500])
+                if len(line) > 500:
+                    line = line[:500]
+                lore_lines.append(line)
     except Exception:
         lore_lines = []
     if lore_lines:
-        user_prompt += "\n\n세계지식(사실, 요약):\n" + "\n".join(lore_lines)
+        prompt_parts.append("\n세계지식(사실, 요약):")
+        prompt_parts.extend(lore_lines)
+    user_prompt = "\n".join(prompt_parts)
     try:
-        completion = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.7,
-        )
-        text = completion.choices[0].message.content or payload.result
+        text = await _call_openai(system_prompt, user_prompt) or payload.result
         return {"text": text, "provider": "openai-compatible"}
     except Exception:
         text = (